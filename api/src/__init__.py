@@ -5,15 +5,23 @@
     :license: Mozilla Public License Version 2.0
 """
 import flask
+import jinja2
 
 def create_app():
     """ Entry point for flask application """
     app = flask.Flask(__name__)
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': jinja2.FileSystemBytecodeCache(),
+    }
 
     from . import db
-    app.config['SQLALCHEMY_DATABASE_URI'] = db.db_uri()
+    database_uri = db.db_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db.engine_options(database_uri)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.db.init_app(app)
+    app.extensions['scores-cache'] = db.ScoresCache()
     app.cli.add_command(db.db_init_command)
     app.cli.add_command(db.db_add_command)
     
@@ -21,5 +29,7 @@ def create_app():
     from . import routes
     app.register_blueprint(api.bp)
     app.register_blueprint(routes.bp)
+    app.extensions['rendered-templates'] = {}
+    app.extensions['static-versions'] = {}
 
     return app
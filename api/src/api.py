@@ -5,30 +5,76 @@
     :license: Mozilla Public License Version 2.0
 """
 import flask
+import flask.views
+import orjson
 
-from src.db import add_new_entry, get_scores_for
+from src.db import add_and_fetch, get_scores_for, score_table
 
 bp = flask.Blueprint('api', __name__, url_prefix='/api')
 
-@bp.route('/<token>/scores', methods=['GET', 'POST'])
-def handle_score_request(token):
-    """ Returns or updates the player scores
+# Range of Score.score, a 32 bit integer column
+SCORE_MIN = -2**31
+SCORE_MAX = 2**31 - 1
 
-        :param token: <str> User's API token
+class ScoresView(flask.views.MethodView):
+    """ Returns or updates the player scores """
+
+    def get(self, token):
+        """ Returns the player scores
+
+            :param token: <str> User's API token
+            :return: Flask.response
+            """
+        return _scores_response(get_scores_for(token))
+
+    def post(self, token):
+        """ Adds a player score and returns the updated scores
+
+            :param token: <str> User's API token
+            :return: Flask.response
+            """
+        try:
+            name, score = _parse_entry(flask.request.get_json(silent=True))
+
+        except (OverflowError, TypeError, ValueError):
+            flask.abort(400)
+
+        return _scores_response(
+            add_and_fetch(token=token, name=name, score=score))
+
+bp.add_url_rule('/<token>/scores', view_func=ScoresView.as_view('scores'))
+
+def _parse_entry(data):
+    """ Validates the body of a score POST
+
+        :param data: The decoded JSON body (None if not JSON)
+        :return: <tuple> The name <str> and score <int>
+        :raises ValueError: If the body doesn't describe a valid score
+        """
+    try:
+        name = data['name']
+        score = data['score']
+
+    except (KeyError, TypeError):
+        raise ValueError('Expected an object with name and score')
+
+    if not isinstance(name, str) or len(name) > score_table.c.name.type.length:
+        raise ValueError('Invalid name')
+
+    if isinstance(score, bool) or (
+            isinstance(score, float) and not score.is_integer()):
+        raise ValueError('Invalid score')
+
+    score = int(score)
+    if not SCORE_MIN <= score <= SCORE_MAX:
+        raise ValueError('Score out of range')
+
+    return name, score
+
+def _scores_response(scores):
+    """ Serializes scores into a JSON response
+
+        :param scores: <list> As returned by get_scores_for
         :return: Flask.response
         """
-    status_code = 200
-    
-    if flask.request.method == 'POST':
-        data = flask.request.get_json()
-        try:
-            add_new_entry(
-                token=token,
-                name=data['name'],
-                score=int(data['score']))
-            
-        except ValueError:
-            status_code = 500
-            
-    response = get_scores_for(token);
-    return flask.jsonify(response), status_code
+    return flask.Response(orjson.dumps(scores), mimetype='application/json')
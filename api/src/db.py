@@ -4,52 +4,232 @@
     :copyright: Copyright (c) 2021 Chris Hughes
     :license: Mozilla Public License Version 2.0
 """
+import cachetools
 import click
 import flask
 import flask_sqlalchemy
 import os
+import sqlalchemy
+import sqlite3
+import threading
+import time
 
 from src.settings import Settings
 
 db = flask_sqlalchemy.SQLAlchemy()
 
+# Scores are cached for the most recently used tokens. Each gunicorn worker
+# has its own cache, so a GET may miss writes made by other workers (or by
+# db-add, or other dynos) until the entry expires. The TTL is kept short to
+# bound that staleness while still absorbing bursts of reads.
+SCORES_CACHE_SIZE = 1024
+SCORES_CACHE_TTL = 1
+
+# Connections allowed by a hobby Postgres plan, shared by all workers
+DATABASE_CONNECTION_LIMIT = 20
+
+# Threads of each gunicorn worker (see Procfile)
+WORKER_THREADS = 8
+
 class Score(db.Model):
     """ Represents a single saved score in the database """
 
     id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(120))
+    token = db.Column(db.String(120), index=True)
     name = db.Column(db.String(120))
     score = db.Column(db.Integer)
 
     def __repr__(self):
         return f'Score(name={self.name}, score={self.score}, token={self.token})'
 
+# The score routes use SQLAlchemy Core on this table rather than the ORM
+score_table = Score.__table__
+
+@sqlalchemy.event.listens_for(sqlalchemy.engine.Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """ Lets SQLite readers run alongside a writer (other backends untouched)
+
+        :param dbapi_connection: The new DBAPI connection
+        :param connection_record: <sqlalchemy.pool._ConnectionRecord>
+        :return: None
+        """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.close()
+
+class ScoresCache:
+    """ Caches the scores of recently used tokens
+
+        Scores are kept per token as a dict of score id to score, so an entry
+        committed while the token was being fetched is never added twice.
+        The lock only guards the cache itself; it is never held during a
+        database call.
+        """
+
+    def __init__(
+            self,
+            maxsize=SCORES_CACHE_SIZE,
+            ttl=SCORES_CACHE_TTL,
+            timer=time.monotonic):
+        self._lock = threading.Lock()
+        self._scores = cachetools.TTLCache(
+            maxsize=maxsize, ttl=ttl, timer=timer)
+        self._generation = 0
+
+    @property
+    def generation(self):
+        """ Counts the entries added so far. Read before fetching scores
+
+            :return: <int>
+            """
+        return self._generation
+
+    def get(self, token):
+        """ Returns the cached scores of a token
+
+            :param token: <str> The token specifying the user
+            :return: <dict> Copy of the scores by id, or None if not cached
+            """
+        with self._lock:
+            scores = self._scores.get(token)
+            return None if scores is None else dict(scores)
+
+    def fill(self, token, scores, generation):
+        """ Caches the scores fetched for a token
+
+            The scores are dropped if they are empty, or if an entry was
+            added after generation was read (it may be missing from them).
+            Any scores already cached for the token are then dropped too,
+            since they are older than the ones fetched.
+
+            :param token: <str> The token specifying the user
+            :param scores: <dict> The fetched scores by id
+            :param generation: <int> Value of generation before fetching
+            :return: None
+            """
+        with self._lock:
+            if scores and generation == self._generation:
+                self._scores[token] = dict(scores)
+            else:
+                self._scores.pop(token, None)
+
+    def add(self, token, score_id, name, score):
+        """ Records a committed entry in the cached scores of its token
+
+            :param token: <str> The token specifying the user
+            :param score_id: <int> Primary key of the new entry
+            :param name: <str> The name of the entry
+            :param score: <int> The player's score
+            :return: <dict> The new score, as the database returns it
+            """
+        new_score = {'name': str(name), 'score': int(score)}
+
+        with self._lock:
+            self._generation += 1
+            scores = self._scores.get(token)
+            if scores is not None:
+                scores[score_id] = new_score
+
+        return new_score
+
 def add_new_entry(token=None, name=None, score=None):
     """ Adds a new entry to the database
 
         :param token: <str> The token specifying the user
         :param name: <str> The name of the entry
         :param score: <int> The player's score
-        :return: None
+        :return: <dict> The new score, as returned by get_scores_for
+        """
+    with db.engine.begin() as connection:
+        score_id = _insert_score(connection, token, name, score)
+
+    return _scores_cache().add(token, score_id, name, score)
+
+def add_and_fetch(token=None, name=None, score=None):
+    """ Adds a new entry and gets the scores for its token in one transaction
+
+        :param token: <str> The token specifying the user
+        :param name: <str> The name of the entry
+        :param score: <int> The player's score
+        :return: <list> As returned by get_scores_for, including the new entry
         """
-    newScore = Score(token=token, name=name, score=score)
-    db.session.add(newScore)
-    db.session.commit()
+    cache = _scores_cache()
+    generation = cache.generation
+
+    # Always read back: the cache may be missing rows added by other workers
+    with db.engine.begin() as connection:
+        score_id = _insert_score(connection, token, name, score)
+        scores = _query_scores_for(token, connection)
+
+    cache.fill(token, scores, generation)
+    cache.add(token, score_id, name, score)
+    return list(scores.values())
 
 def get_scores_for(token):
     """ Gets the scores for a user specified with the given token
 
+        Results are cached per token for up to SCORES_CACHE_TTL seconds.
+        Entries added with add_new_entry are added to the cached results
+        without querying again.
+
         :param token: <str> The token specifying the user who is making query
         :return: <list> With query info. Each result specified as dict
         """
-    results = []
-    for score in Score.query.filter_by(token=token):
-        results.append({
-            'name': score.name,
-            'score': score.score,
-        })
+    cache = _scores_cache()
+    generation = cache.generation
+    scores = cache.get(token)
+
+    if scores is None:
+        with db.engine.connect() as connection:
+            scores = _query_scores_for(token, connection)
+
+        # Tokens without scores aren't cached, so unknown tokens can't fill it
+        cache.fill(token, scores, generation)
+
+    return list(scores.values())
+
+def _insert_score(connection, token, name, score):
+    """ Inserts a new entry
+
+        :param connection: <sqlalchemy.engine.Connection> To insert with
+        :param token: <str> The token specifying the user
+        :param name: <str> The name of the entry
+        :param score: <int> The player's score
+        :return: <int> Primary key of the new entry
+        """
+    result = connection.execute(
+        score_table.insert(), {'token': token, 'name': name, 'score': score})
+
+    return result.inserted_primary_key[0]
+
+def _query_scores_for(token, connection):
+    """ Queries the database for the scores of the given token
+
+        :param token: <str> The token specifying the user
+        :param connection: <sqlalchemy.engine.Connection> To query with
+        :return: <dict> Each result specified as dict, keyed by score id
+        """
+    query = sqlalchemy.select(
+        score_table.c.id, score_table.c.name, score_table.c.score).where(
+            score_table.c.token == token)
 
-    return results
+    return {
+        score_id: {'name': name, 'score': score}
+        for score_id, name, score in connection.execute(query)
+    }
+
+def _scores_cache():
+    """ Returns the scores cache of the current app
+
+        :return: <ScoresCache>
+        """
+    return flask.current_app.extensions['scores-cache']
 
 def db_uri():
     """ Returns the database URI
@@ -60,6 +240,33 @@ def db_uri():
         'postgres://', 'postgresql://') or \
         Settings.instance()['database-uri']
 
+def engine_options(uri):
+    """ Returns the SQLAlchemy engine options for the database URI
+
+        SQLite keeps SQLAlchemy's defaults. Other databases get a pool with
+        a connection for each gunicorn thread (plus a little overflow), cut
+        down so the pools of all workers stay within
+        DATABASE_CONNECTION_LIMIT. gunicorn takes its worker count from
+        WEB_CONCURRENCY, as the Procfile doesn't set one.
+
+        :param uri: <str> The database URI
+        :return: <dict>
+        """
+    if sqlalchemy.engine.make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    connections = max(
+        1,
+        min(WORKER_THREADS + 2, DATABASE_CONNECTION_LIMIT // workers))
+    pool_size = min(WORKER_THREADS, connections)
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': connections - pool_size,
+        'pool_recycle': 1800,
+    }
+
 @click.command('db-init')
 @flask.cli.with_appcontext
 def db_init_command():
@@ -68,6 +275,12 @@ def db_init_command():
         :return: None
         """
     db.create_all()
+
+    # create_all() skips tables that already exist, so add any indexes
+    # missing from databases created before they were introduced
+    for index in Score.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
     click.echo(f'Created the database {Settings.instance()["database-uri"]}')
 
 @click.command('db-add')
@@ -82,5 +295,5 @@ def db_add_command(token, name, score):
         :param name: <str> The scorer's name
         :param score: <int> The scorer's score
         """
-    add_new_entry(token=token, name=name, score=score)
-    click.echo(f'Added {newScore} to {Settings.instance()["database-uri"]}')
+    new_score = add_new_entry(token=token, name=name, score=score)
+    click.echo(f'Added {new_score} to {Settings.instance()["database-uri"]}')
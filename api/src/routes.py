@@ -5,35 +5,117 @@
     :license: Mozilla Public License Version 2.0
 """
 import flask
+import hashlib
+import pathlib
 import secrets
+import werkzeug.http
+import werkzeug.security
 
 from src.settings import Settings
 
 bp = flask.Blueprint('routes', __name__)
 
+# Versioned static files never change, so browsers may cache them for a year
+STATIC_VERSIONED_MAX_AGE = 365 * 24 * 60 * 60
+
 @bp.route('/')
 def index():
     """ Renders the index page """
-    
-    # Render contents
-    context = {
-        'settings': Settings.instance()
-    }
-    
-    contents = flask.render_template('index.html', **context)
+    contents, etag = _render_template('index.html')
     response = flask.make_response(contents)
+    response.set_etag(etag)
 
-    if not flask.request.cookies.get(Settings.instance()['cookie-id']):
-        response.set_cookie(
-            Settings.instance()['cookie-id'],
-            secrets.token_urlsafe())
+    cookie_id = Settings.instance()['cookie-id']
+    if not flask.request.cookies.get(cookie_id):
+        response.set_cookie(cookie_id, secrets.token_urlsafe())
 
-    return response
+    return response.make_conditional(flask.request)
 
 @bp.route('/robots.txt')
 def robots():
     """ Serves the robot.txt page """
-    contents = flask.render_template('robots.txt');
+    contents, etag = _render_template('robots.txt')
     response = flask.make_response(contents)
     response.headers['Content-Type'] = 'text'
+    response.set_etag(etag)
+    return response.make_conditional(flask.request)
+
+@bp.after_app_request
+def cache_versioned_static(response):
+    """ Lets browsers cache static files requested by their version
+
+        :param response: <flask.Response> The response to a request
+        :return: <flask.Response>
+        """
+    request = flask.request
+    if request.endpoint == 'static' and response.status_code == 200 and \
+       request.args.get('v') and \
+       request.args['v'] == _static_version(request.view_args['filename']):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.cache_control.max_age = STATIC_VERSIONED_MAX_AGE
+
     return response
+
+@bp.app_template_global()
+def static_url(filename):
+    """ Returns the URL of a static file, versioned by a hash of its contents
+
+        :param filename: <str> Path of the file in the static folder
+        :return: <str>
+        """
+    version = _static_version(filename)
+    if version is None:
+        return flask.url_for('static', filename=filename)
+
+    return flask.url_for('static', filename=filename, v=version)
+
+def _static_version(filename):
+    """ Returns a hash of a static file's contents
+
+        Hashes are cached per app and recomputed when the file is modified.
+
+        :param filename: <str> Path of the file in the static folder
+        :return: <str> Or None if the file can't be read
+        """
+    app = flask.current_app
+    path = werkzeug.security.safe_join(app.static_folder, filename)
+    if path is None:
+        return None
+
+    path = pathlib.Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+        cached = app.extensions['static-versions'].get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        version = hashlib.md5(path.read_bytes()).hexdigest()[:12]
+
+    except OSError:
+        return None
+
+    app.extensions['static-versions'][filename] = mtime, version
+    return version
+
+def _render_template(template):
+    """ Renders a template with the app settings
+
+        The contents only depend on the settings, so they are rendered once
+        per app and reused (unless the app is in debug mode).
+
+        :param template: <str> Name of the template
+        :return: <tuple> The encoded contents and their ETag
+        """
+    app = flask.current_app
+    rendered = app.extensions['rendered-templates'].get(template)
+    if rendered is None:
+        contents = flask.render_template(
+            template, settings=Settings.instance()).encode()
+
+        rendered = contents, werkzeug.http.generate_etag(contents)
+        if not app.debug:
+            app.extensions['rendered-templates'][template] = rendered
+
+    return rendered
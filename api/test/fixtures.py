@@ -29,3 +29,7 @@ def app():
     # Cleanup
     os.close(db_fd)
     os.unlink(db_path)
+
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
@@ -4,7 +4,8 @@
     :copyright: Copyright (c) 2021 Chris Hughes
     :license: Mozilla Public License Version 2.0
 """
-from src.db import db, Score
+from src import create_app
+from src.db import db, Score, ScoresCache, SCORES_CACHE_TTL
 from test.fixtures import app
 
 def test_get_method(app):
@@ -61,6 +62,40 @@ def test_post_method(app):
         assert scores[0].name == data['name']
         assert scores[0].score == data['score']
 
+def test_post_method_other_app(app):
+    """ Test /<token>/scores POST returns scores added by another app """
+
+    token = '1234'
+    other_app = create_app()
+    scores = [{'name': name, 'score': 100} for name in ('x', 'y', 'z')]
+
+    with app.test_client() as client, other_app.test_client() as other:
+        client.post(f'/api/{token}/scores', json=scores[0])
+        other.get(f'/api/{token}/scores')
+        client.post(f'/api/{token}/scores', json=scores[1])
+
+        response = other.post(f'/api/{token}/scores', json=scores[2])
+        assert response.get_json() == scores
+
+def test_get_method_other_app(app):
+    """ Test /<token>/scores GET sees scores added by another app """
+
+    token = '1234'
+    scores = [{'name': 'x', 'score': 100}, {'name': 'y', 'score': 200}]
+
+    # Control the other app's cache clock to expire its entries
+    now = [0]
+    other_app = create_app()
+    other_app.extensions['scores-cache'] = ScoresCache(timer=lambda: now[0])
+
+    with app.test_client() as client, other_app.test_client() as other:
+        client.post(f'/api/{token}/scores', json=scores[0])
+        assert other.get(f'/api/{token}/scores').get_json() == scores[:1]
+
+        client.post(f'/api/{token}/scores', json=scores[1])
+        now[0] += SCORES_CACHE_TTL + 1
+        assert other.get(f'/api/{token}/scores').get_json() == scores
+
 def test_post_invalid_token(app):
     """ Test /<token>/scores POST with invalid token """
     
@@ -75,15 +110,48 @@ def test_post_invalid_data(app):
     
     with app.test_client() as client:
         response = client.post(f'/api/{token}/scores', json=data)
-        assert response.status_code >= 500
+        assert response.status_code == 400
 
         data = { 'name':'name', 'score':'score' }
         response = client.post(f'/api/{token}/scores', json=data)
-        assert response.status_code >= 500
+        assert response.status_code == 400
 
-        data = { 'name':'name', 'score':100 }
+        data = { 'name':'name', 'score':None }
+        response = client.post(f'/api/{token}/scores', json=data)
+        assert response.status_code == 400
+
+        response = client.post(f'/api/{token}/scores', data='not json')
+        assert response.status_code == 400
+
+        invalid_data = [
+            { 'name':['name'], 'score':100 },
+            { 'name':{'a':1}, 'score':100 },
+            { 'name':456, 'score':100 },
+            { 'name':'n' * 121, 'score':100 },
+            { 'name':'name', 'score':True },
+            { 'name':'name', 'score':1.5 },
+            { 'name':'name', 'score':[100] },
+            { 'name':'name', 'score':1e300 },
+            { 'name':'name', 'score':2**31 },
+            { 'name':'name', 'score':-2**31 - 1 },
+            { 'name':'name', 'score':9223372036854775808 },
+            { 'name':'name', 'score':100000000000000000000 },
+            [ 'name', 100 ],
+        ]
+        for data in invalid_data:
+            response = client.post(f'/api/{token}/scores', json=data)
+            assert response.status_code == 400
+
+        response = client.post(
+            f'/api/{token}/scores',
+            data='{"name": "name", "score": Infinity}',
+            content_type='application/json')
+        assert response.status_code == 400
+
+        data = { 'name':'name', 'score':2**31 - 1 }
         response = client.post(f'/api/{token}/scores', json=data)
         assert response.status_code == 200
+        assert response.get_json() == [data]
 
 def test_get_invalid_token(app):
     """ Test /<token>/scores GET with invalid token """
@@ -92,4 +160,9 @@ def test_get_invalid_token(app):
         response = client.get(f'/api//scores')
         assert response.status_code == 404
 
+def test_unsupported_method(app):
+    """ Test /<token>/scores with an unsupported method """
 
+    with app.test_client() as client:
+        response = client.delete('/api/1234/scores')
+        assert response.status_code == 405
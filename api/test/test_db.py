@@ -17,7 +17,10 @@ def test_add_new_entry(app):
     score = 100
     
     with app.app_context():
-        db.add_new_entry(token, name, score)
+        assert db.add_new_entry(token, name, score) == {
+            'name': name,
+            'score': score,
+        }
         
         scores = db.Score.query.all()
         assert len(scores) == 1
@@ -45,7 +48,76 @@ def test_get_scores_for(app):
         for ii in range(2):
             assert scoresForToken[ii]['name'] == names[ii]
             assert scoresForToken[ii]['score'] == scores[ii]
+
+def test_get_scores_for_cached(app):
+    """ Test that get_scores_for is cached and updated by new entries """
+
+    token = '1234'
+
+    with app.app_context():
+        db.add_new_entry(token=token, name='name1', score=100)
+        assert len(db.get_scores_for(token)) == 1
+
+        # Bypass add_new_entry so the cache is not updated
+        db.db.session.add(db.Score(token=token, name='name2', score=200))
+        db.db.session.commit()
+        assert len(db.get_scores_for(token)) == 1
+
+        db.add_new_entry(token=token, name='name3', score=300)
+        assert db.get_scores_for(token) == [
+            {'name': 'name1', 'score': 100},
+            {'name': 'name3', 'score': 300},
+        ]
     
+def test_scores_cache_fill():
+    """ Test that fetched scores are only cached if nothing was added since """
+
+    cache = db.ScoresCache()
+    scores = {1: {'name': 'name1', 'score': 100}}
+
+    generation = cache.generation
+    cache.add('4321', 2, 'name2', 200)
+    cache.fill('1234', scores, generation)
+    assert cache.get('1234') is None
+
+    cache.fill('1234', scores, cache.generation)
+    assert cache.get('1234') == scores
+
+def test_scores_cache_add():
+    """ Test that added scores are normalized and never duplicated """
+
+    cache = db.ScoresCache()
+
+    # Entry 2 was committed before the scores were fetched
+    generation = cache.generation
+    scores = {
+        1: {'name': 'name1', 'score': 100},
+        2: {'name': '456', 'score': 200},
+    }
+    cache.fill('1234', scores, generation)
+
+    assert cache.add('1234', 2, 456, 200.0) == {'name': '456', 'score': 200}
+    assert cache.get('1234') == scores
+
+def test_get_scores_for_unknown_token(app):
+    """ Test that tokens without scores are not cached """
+
+    token = '1234'
+
+    with app.app_context():
+        assert db.get_scores_for(token) == []
+
+        db.db.session.add(db.Score(token=token, name='name1', score=100))
+        db.db.session.commit()
+        assert db.get_scores_for(token) == [{'name': 'name1', 'score': 100}]
+
+def test_sqlite_pragmas(app):
+    """ Test that SQLite connections are put in WAL mode """
+
+    with app.app_context():
+        journal_mode = db.db.session.execute('PRAGMA journal_mode').scalar()
+        assert journal_mode == 'wal'
+
 def test_db_uri(app):
     """ Tests the database URI """
 
@@ -56,3 +128,16 @@ def test_db_uri(app):
         
         assert db.db_uri() == settings.Settings.instance()['database-uri']
 
+def test_engine_options(monkeypatch):
+    """ Tests the engine options """
+
+    assert db.engine_options('sqlite:///db.sqlite3') == {}
+
+    # The pools of all workers must fit in the database's connection limit
+    for workers in (1, 2, 3, 4, 8):
+        monkeypatch.setenv('WEB_CONCURRENCY', str(workers))
+        options = db.engine_options('postgresql://user@host/db')
+        connections = options['pool_size'] + options['max_overflow']
+
+        assert options['pool_size'] <= db.WORKER_THREADS
+        assert workers * connections <= db.DATABASE_CONNECTION_LIMIT
@@ -7,6 +7,7 @@
 import bs4
 import flask
 
+from src import create_app, routes
 from src.settings import Settings
 from test.fixtures import app
 
@@ -30,6 +31,26 @@ def test_serve_js(app):
 
         assert client.get(js_url).status_code == 200
 
+def test_serve_js_cached(app):
+    """ Test that versioned javascript can be cached by the browser """
+
+    with app.test_client() as client:
+        response = client.get('/').data
+        soup = bs4.BeautifulSoup(response, 'html.parser')
+        js_url = soup.find(id='asteroids-entry')['src']
+
+        response = client.get(js_url)
+        assert response.cache_control.immutable
+        assert response.cache_control.max_age == \
+            routes.STATIC_VERSIONED_MAX_AGE
+
+        response = client.get(js_url.split('?')[0])
+        assert response.cache_control.no_cache
+
+        response = client.get(js_url.split('?')[0] + '?v=wrong')
+        assert not response.cache_control.immutable
+        assert response.cache_control.no_cache
+
 def test_serve_robots(app):
     """ Test that robots.txt is served correctly """
 
@@ -37,6 +58,31 @@ def test_serve_robots(app):
         response = client.get('/robots.txt')
         assert response.status_code == 200
 
+def test_index_not_modified(app):
+    """ Test that the index page honours its ETag """
+
+    with app.test_client() as client:
+        response = client.get('/')
+        etag = response.headers['ETag']
+
+        response = client.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+def test_index_cached_per_app(app):
+    """ Test that each app renders its own index page """
+
+    with app.test_client() as client:
+        client.get('/')
+
+    Settings.instance()['page-title'] = 'Other title'
+    try:
+        with create_app().test_client() as client:
+            soup = bs4.BeautifulSoup(client.get('/').data, 'html.parser')
+            assert soup.title.string == 'Other title'
+
+    finally:
+        Settings.destroy()
+
 def test_cookie(app):
     """ Test that cookies are provided in response """
 
@@ -49,4 +95,11 @@ def test_cookie(app):
         response = client.get('/cookie_echo')
         assert response.get_json().get(
             Settings.instance()['cookie-id']) is not None
-        
+
+def test_cookie_not_replaced(app):
+    """ Test that an existing cookie is kept """
+
+    with app.test_client() as client:
+        client.set_cookie('localhost', Settings.instance()['cookie-id'], 'abc')
+        response = client.get('/')
+        assert 'Set-Cookie' not in response.headers
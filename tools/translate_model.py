@@ -1,3 +1,16 @@
+"""
+    Centers a model's vertices on the midpoint between its first vertex
+    and the vertex furthest from it
+
+    Requires numpy, which isn't needed by the app itself:
+
+        pip install -r tools/requirements.txt
+
+    :copyright: Copyright (c) 2021 Chris Hughes
+    :license: Mozilla Public License Version 2.0
+"""
+import numpy as np
+
 vertices = [
     [70, 22],
     [58, 22],
@@ -13,35 +26,17 @@ vertices = [
     [76, 30],
 ]
 
-anchor_point = vertices[0]
-furthest_from_anchor = 0
-opposite_point = [0, 0]
+points = np.asarray(vertices, dtype=np.float64)
+anchor_point = points[0]
 
-for vertex in vertices:
-    distance = (
-        ((vertex[0]-anchor_point[0])**2) +
-        ((vertex[1]-anchor_point[1])**2) 
-    ) ** 0.5
+# Squared distances order the same as distances, so skip the sqrt
+distances_sq = ((points - anchor_point) ** 2).sum(axis=1)
+opposite_point = points[distances_sq.argmax()]
 
-    if distance > furthest_from_anchor:
-        furthest_from_anchor = distance
-        opposite_point = vertex
-
-difference = [
-    (anchor_point[0] - opposite_point[0])/2,
-    (anchor_point[1] - opposite_point[1])/2,
-]
-translation = [
-    anchor_point[0] - difference[0],
-    anchor_point[1] - difference[1]
-]
+translation = (anchor_point + opposite_point) / 2
 
-print(f'translation: {translation}')
+print(f'translation: {translation.tolist()}')
 print('New coordinates:')
 
-for vertex in vertices:
-    new_pos = [
-        vertex[0] - translation[0],
-        vertex[1] - translation[1]
-    ]
-    print(f'    {new_pos}')
+for new_pos in points - translation:
+    print(f'    {new_pos.tolist()}')